@@ -1,20 +1,69 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import akshare as ak
+import os
+import json
+import hashlib
 import time
 import threading
-import ssl
+import importlib
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import plotly.graph_objects as go 
-from datetime import datetime, timedelta, timezone
+from streamlit_autorefresh import st_autorefresh
+from datetime import date, datetime, timedelta, timezone
 
-# --- 1. SSL 补丁 ---
 try:
-    _create_unverified_https_context = ssl._create_unverified_context
-except AttributeError:
-    pass
-else:
-    ssl._create_default_https_context = _create_unverified_https_context
+    import numexpr as ne # 可选加速，未安装时退回 NumPy
+except ImportError:
+    ne = None
+
+# 写时复制：派生表改列不会影响共享的行情快照，也无需防御性 copy
+pd.set_option('mode.copy_on_write', True)
+
+# --- 1. akshare 网络适配 ---
+# akshare 行情/日线模块内部直接调用 requests.get/post，这里只把这几个模块里的 requests 名字换成
+# 转发到连接池 Session 的代理对象；requests 模块本身不改，Streamlit 等其他调用不受影响，证书校验保持默认开启
+# （脚本每次重跑都会执行到这里，Session 用 cache_resource 保证进程内只建一个、连接池跨重跑复用）
+# 连接层失败（握手超时、连接被重置）在 Session 内短退避重试，不占用上层的取数重试次数
+@st.cache_resource(show_spinner=False)
+def get_ak_session():
+    session = requests.Session()
+    retry = Retry(total=2, backoff_factor=0.3)
+    session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=retry))
+    session.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=retry))
+    return session
+
+# 线程安全：UI 线程池、预取线程池与后台引擎共用同一个 Session。建好后不再修改其配置，
+# 各线程只发 GET/POST；连接池 (urllib3 PoolManager) 与 cookie jar 自带锁，可并发使用
+class AkHttp:
+    def __init__(self, session):
+        self.session = session
+
+    def get(self, url, params=None, **kwargs):
+        return self.session.get(url, params=params, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        return self.session.post(url, data=data, json=json, **kwargs)
+
+    def __getattr__(self, name): # requests.exceptions 等其余属性照旧取自 requests 模块
+        return getattr(requests, name)
+
+# stock_zh_a_hist / stock_zh_a_spot_em 所在模块；新版 akshare 的分页取数在 utils.func 中
+AK_HTTP_MODULES = ("akshare.stock_feature.stock_hist_em", "akshare.utils.func")
+
+AK_HTTP = AkHttp(get_ak_session())
+for module_name in AK_HTTP_MODULES:
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError:
+        continue # 不同 akshare 版本模块布局不同，缺失即跳过
+    if hasattr(module, "requests"): module.requests = AK_HTTP
 
 # --- 2. 页面配置 ---
 st.set_page_config(
@@ -25,94 +74,276 @@ st.set_page_config(
 )
 
 # --- 3. 独立缓存函数 ---
-@st.cache_data(ttl=14400, show_spinner=False)
-def fetch_stock_history_analysis(symbol_str, current_price_ref):
-    symbol_str = str(symbol_str)
-    time.sleep(random.uniform(1.0, 2.0))
-    
+# 落盘 JSON 缓存：进程重启 / 多 worker 之间共享，读写失败一律视为未命中
+class FileCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+        except OSError:
+            pass
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                entry = json.load(f)
+            if time.time() - entry["ts"] <= entry["ttl"]:
+                return entry["v"]
+        except Exception:
+            pass
+        return None
+
+    def set(self, key, val, ttl=86400):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"ts": time.time(), "ttl": ttl, "v": val}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception:
+            pass
+
+hist_cache = FileCache(os.path.join(".cache", "hist"))
+
+# DataFrame 落盘：先写临时文件再 os.replace，读者不会读到写了一半的文件；失败只是少一层缓存
+# (pickle 而非 parquet：无需额外引入 pyarrow 依赖)
+def write_pickle_atomic(df, path):
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        pass
+
+# 防封限流：限制并发请求数，并保证相邻两次请求的最小间隔（取代每次固定随机 sleep）
+class RateLimiter:
+    def __init__(self, max_concurrent, min_interval):
+        self.semaphore = threading.BoundedSemaphore(max_concurrent)
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.last_call = 0.0
+
+    def __enter__(self):
+        self.semaphore.acquire()
+        with self.lock:
+            wait = self.last_call + self.min_interval - time.monotonic()
+            if wait > 0: time.sleep(wait)
+            self.last_call = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.semaphore.release()
+
+# 限流器须在所有会话、所有重跑间共享
+@st.cache_resource(show_spinner=False)
+def get_hist_rate_limiter():
+    return RateLimiter(max_concurrent=3, min_interval=0.3)
+
+hist_rate_limiter = get_hist_rate_limiter()
+HIST_KEEP_DAYS = 120 # 覆盖 K 线图 100 根 + 均线分析 30 根
+HIST_LOOKBACK_DAYS = 200 # 自然日：120 个交易日约 170 天，再留出春节/国庆长假余量
+HIST_RAW_DIR = os.path.join(".cache", "hist_raw")
+HIST_RAW_TTL = 1800 # 日线新鲜度档位 (30 分钟)：当日K线盘中仍在变化，内存、磁盘与 K 线图缓存都按同一档位失效
+# 当前时间所在档位，作为日线相关缓存键的一部分：跨档即失效，各层叠加后数据年龄也不超过一个档位
+def hist_time_bucket():
+    return int(time.time() // HIST_RAW_TTL)
+
+HIST_FAIL_TTL = 180 # 取数失败的负缓存：封禁/接口异常期间不在每次重跑时反复请求上游
+
+def hist_fail_key(symbol_str):
+    return hashlib.md5(f"{symbol_str}:fail".encode()).hexdigest()
+
+# akshare 固定中文列名 -> 内部英文列名
+AK_HIST_RENAME = {'日期': 'Date', '开盘': 'Open', '收盘': 'Close', '最高': 'High', '最低': 'Low'}
+AK_SPOT_RENAME = {
+    '代码': 'Symbol', '名称': 'Name', '最新价': 'Price',
+    '涨跌幅': 'Change_Pct', '换手率': 'Turnover_Rate',
+    '量比': 'Volume_Ratio', '总市值': 'Market_Cap',
+    '流通市值': 'Circulating_Cap',
+    '最高': 'High', '最低': 'Low', '今开': 'Open',
+    '成交量': 'Volume', '成交额': 'Amount'
+}
+
+# 常见列名直接集合命中，未命中时再退回子串匹配
+CLOSE_ALIASES = frozenset({"收盘", "close", "Close", "latest", "最新价"})
+LOW_ALIASES = frozenset({"最低", "low", "Low"})
+
+def find_column(columns, aliases, keywords):
+    for col in columns:
+        if col in aliases: return col
+    for col in columns:
+        if any(k in col or k in col.lower() for k in keywords): return col
+    return None
+
+# 日线历史统一从这里取：均线分析与 K 线图共用同一份缓存，只发一次请求
+# 取数失败时抛异常而不是返回空表，避免把失败结果缓存整个档位；失败信息另写入 hist_cache 保留 HIST_FAIL_TTL，
+# 期间同一代码直接抛出上次的错误，均线分析与 K 线图都不再请求
+# 内存缓存之外每个代码再落盘一份，新会话 / 进程重启后不必重新拉取；磁盘文件只在写入档位内有效，
+# 与按 time_bucket 键入的内存缓存同步失效，不会出现旧盘文件再被内存缓存续命的叠加
+@st.cache_data(ttl=HIST_RAW_TTL, show_spinner=False)
+def fetch_hist_raw(symbol_str, time_bucket):
+    trade_date = datetime.now(timezone(timedelta(hours=8))).date()
+    disk_path = os.path.join(HIST_RAW_DIR, f"{symbol_str}.pkl")
+    try:
+        if int(os.path.getmtime(disk_path) // HIST_RAW_TTL) == time_bucket:
+            return pd.read_pickle(disk_path)
+    except Exception:
+        pass
+
+    fail_key = hist_fail_key(symbol_str)
+    failed = hist_cache.get(fail_key)
+    if failed is not None: raise RuntimeError(failed)
+
+    # 只请求最近一段日期，不拉上市以来的全部日线
+    start_date = f"{trade_date - timedelta(days=HIST_LOOKBACK_DAYS):%Y%m%d}"
+    end_date = f"{trade_date:%Y%m%d}"
     error_log = ""
     hist_df = pd.DataFrame()
 
     try:
-        hist_df = ak.stock_zh_a_hist(symbol=symbol_str, period="daily", adjust="qfq")
+        with hist_rate_limiter:
+            hist_df = ak.stock_zh_a_hist(symbol=symbol_str, period="daily", start_date=start_date, end_date=end_date, adjust="qfq")
     except Exception as e:
         error_log = str(e)
     
-    if hist_df.empty:
+    # 403 说明 IP 已被限制，换复权方式重试只会再撞一次墙
+    if hist_df.empty and "403" not in error_log:
         try:
-            time.sleep(1)
-            hist_df = ak.stock_zh_a_hist(symbol=symbol_str, period="daily", adjust="")
+            with hist_rate_limiter:
+                hist_df = ak.stock_zh_a_hist(symbol=symbol_str, period="daily", start_date=start_date, end_date=end_date, adjust="")
         except Exception as e:
             error_log = f"{error_log} | {str(e)}"
 
     if hist_df.empty:
-        if "403" in error_log: return "⛔ IP被封", "⛔ IP被封"
-        return "❌ 接口空", "❌ 接口空"
+        error_log = error_log or "empty"
+        hist_cache.set(fail_key, error_log, ttl=HIST_FAIL_TTL)
+        raise RuntimeError(error_log)
+    
+    hist_df = hist_df.tail(HIST_KEEP_DAYS)
+    hist_df.columns = [str(c).strip() for c in hist_df.columns]
+
+    write_pickle_atomic(hist_df, disk_path)
+    return hist_df
+
+# 只算与现价无关的历史水位 (MA5, MA10, 20日最低)，趋势/位置判定交给 YangStrategy.classify_history 批量完成
+# 返回 (水位, 错误)：成功时错误为 None；失败时水位为 None、错误为 (均线列, 位置列) 的提示文案
+# 水位本身不另做缓存：只是 30 个数上的三次归约，新鲜度完全跟随 fetch_hist_raw
+def fetch_history_levels(symbol_str):
+    symbol_str = str(symbol_str)
+    try:
+        hist_df = fetch_hist_raw(symbol_str, hist_time_bucket())
+    except Exception as e:
+        if "403" in str(e): return None, ("⛔ IP被封", "⛔ IP被封")
+        return None, ("❌ 接口空", "❌ 接口空")
     
     try:
-        hist_df.columns = [str(c).strip() for c in hist_df.columns]
-        close_col = None
-        for col in hist_df.columns:
-            if "收盘" in col or "close" in col.lower(): close_col = col; break
-        low_col = None
-        for col in hist_df.columns:
-            if "最低" in col or "low" in col.lower(): low_col = col; break
-
-        if not close_col: return f"⚠️ 缺列", "⚠️ 格式错误"
-
-        hist_df = hist_df.rename(columns={close_col: 'close', low_col: 'low'})
-        hist_df['close'] = pd.to_numeric(hist_df['close'], errors='coerce')
-        hist_df['low'] = pd.to_numeric(hist_df['low'], errors='coerce')
-
-        hist_df = hist_df.tail(30)
-        close_prices = hist_df['close']
-        
-        ma5 = close_prices.rolling(5).mean().iloc[-1] if len(close_prices) >= 5 else 0
-        ma10 = close_prices.rolling(10).mean().iloc[-1] if len(close_prices) >= 10 else 0
-        
-        trend_str = "⚪ 震荡"
-        if ma5 > 0 and current_price_ref > ma5:
-            if ma10 > 0 and ma5 > ma10:
-                trend_str = "📈 多头排列"
-            else:
-                trend_str = "📈 短线强势"
-        elif ma5 > 0 and current_price_ref < ma5:
-            trend_str = "📉 破5日线"
+        close_col = find_column(hist_df.columns, CLOSE_ALIASES, ("收盘", "close"))
+        low_col = find_column(hist_df.columns, LOW_ALIASES, ("最低", "low"))
+
+        if not close_col: return None, ("⚠️ 缺列", "⚠️ 格式错误")
+
+        # 只取最近 30 根的 NumPy 切片，不再构造 tail 中间表
+        close_prices = pd.to_numeric(hist_df[close_col].to_numpy()[-30:], errors='coerce')
+        low_prices = pd.to_numeric(hist_df[low_col].to_numpy()[-30:], errors='coerce')
         
-        lowest_20 = hist_df['low'].tail(20).min()
-        if pd.isna(lowest_20) or lowest_20 == 0: lowest_20 = 0.01 
+        # 只需最后一个窗口的均值，直接对尾部切片求均值
+        ma5 = close_prices[-5:].mean() if close_prices.size >= 5 else 0
+        ma10 = close_prices[-10:].mean() if close_prices.size >= 10 else 0
         
-        position_ratio = current_price_ref / lowest_20
-        pos_str = "✅ 底部/腰部"
-        if position_ratio > 1.6:
-            pos_str = "⚠️ 高位(慎)" 
+        low_20 = low_prices[-20:]
+        lowest_20 = np.nanmin(low_20) if not np.isnan(low_20).all() else np.nan
+        if not (lowest_20 > 0): lowest_20 = 0.01 # NaN 与 0 一并兜底
         
-        return trend_str, pos_str
+        return (float(ma5), float(ma10), float(lowest_20)), None
 
     except Exception as e:
-        return f"⚠️ 算力错", f"⚠️ Check"
+        return None, ("⚠️ 算力错", "⚠️ Check")
+
+@st.cache_data(show_spinner=False)
+def parse_holdings(raw_text):
+    return tuple(c.strip() for c in raw_text.split(',') if c.strip())
 
 # --- 4. K线图数据 ---
-@st.cache_data(ttl=3600)
-def get_kline_data(symbol, name):
+# 滑动窗口视图上直接做归约，与 Series.rolling(window) 结果一致（不足一窗为 NaN）
+def rolling_window_stat(values, window, func, **kwargs):
+    out = np.full(values.shape, np.nan)
+    if values.size >= window:
+        out[window - 1:] = func(sliding_window_view(values, window), axis=1, **kwargs)
+    return out
+
+# akshare 日期列通常已是 YYYY-MM-DD 字符串或 date 对象，直接转字符串，省去解析再格式化
+def format_dates(dates):
+    first = dates.iloc[0] if len(dates) else None
+    if (isinstance(first, str) and len(first) == 10 and first[4] == '-') or \
+            (isinstance(first, date) and not isinstance(first, datetime)):
+        return dates.astype(str)
+    return pd.to_datetime(dates).dt.strftime('%Y-%m-%d')
+
+# time_bucket 与 fetch_hist_raw 对齐，图表不会在日线过期后继续沿用旧结果
+@st.cache_data(ttl=HIST_RAW_TTL)
+def get_kline_data(symbol, name, time_bucket):
     try:
-        df = ak.stock_zh_a_hist(symbol=str(symbol), period="daily", adjust="qfq").tail(100)
-        df.columns = [str(c).strip() for c in df.columns]
-        rename_map = {}
-        for c in df.columns:
-            if "日期" in c: rename_map[c] = 'Date'
-            elif "开盘" in c: rename_map[c] = 'Open'
-            elif "收盘" in c: rename_map[c] = 'Close'
-            elif "最高" in c: rename_map[c] = 'High'
-            elif "最低" in c: rename_map[c] = 'Low'
+        df = fetch_hist_raw(str(symbol), time_bucket).tail(100)
+        df = df.rename(columns=AK_HIST_RENAME)
+        df['Date'] = format_dates(df['Date'])
         
-        df = df.rename(columns=rename_map)
-        df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d')
+        # 均线与布林带随 K 线一起缓存，重复点选同一标的不再重算
+        close = df['Close'].to_numpy(dtype=np.float64)
+        df['MA5'] = rolling_window_stat(close, 5, np.mean)
+        df['MA10'] = rolling_window_stat(close, 10, np.mean)
+        df['MA20'] = rolling_window_stat(close, 20, np.mean) 
+        df['STD20'] = rolling_window_stat(close, 20, np.std, ddof=1)
+        df['UPPER'] = df['MA20'] + 2 * df['STD20']
+        df['LOWER'] = df['MA20'] - 2 * df['STD20'] 
         return df
     except:
         return pd.DataFrame()
 
 # --- 5. 核心策略逻辑 ---
+# 形态编码表：(名称, 形态分, 胜率加减分)，下标即 calculate_battle_plan 中的 morph_code
+MORPH_TYPES = (
+    ("数据缺失", 0, 0),
+    ("💣 炸板", -10, -30),
+    ("🚀 光头强", 10, 15),
+    ("⚡ 长上影", 0, -15),
+    ("✅ 均势", 5, 0),
+)
+VWAP_TYPES = ("", "🌊水上", "🏊水下")
+MORPH_LABELS = np.array([
+    name if code == 0 else f"{name} | {vwap}"
+    for code, (name, _, _) in enumerate(MORPH_TYPES) for vwap in VWAP_TYPES
+], dtype=object)
+MORPH_SCORES = np.array([t[1] for t in MORPH_TYPES])
+MORPH_WIN_BONUS = np.array([t[2] for t in MORPH_TYPES])
+MORPH_GUANGTOU = 2 # 🚀 光头强 在 MORPH_TYPES 中的下标，需要历史深扫的行按此编码筛出
+
+FILTER_EXPR = (
+    "(market_cap_billions <= max_cap) & (turnover >= min_turnover) & "
+    "(change_pct >= min_change) & (change_pct <= max_change) & "
+    "(vol_ratio >= min_vol_ratio) & (circulating_ratio >= min_circ_ratio)"
+)
+
+# 排序偏好 -> 排序键（均为降序），侧边栏选项也取自这里
+SORT_RULES = {
+    "🔥 综合评分 (默认)": ['Win_Score', 'Turnover_Rate'],
+    "🚀 形态优先 (光头强)": ['Morph_Score', 'Win_Score'], # 先按形态分(Morph_Score)，再按胜率分
+    "💰 资金优先 (换手)": ['Turnover_Rate', 'Win_Score'],
+    "🌊 抢筹优先 (量比)": ['Volume_Ratio', 'Win_Score'],
+}
+TOP_N_LIMIT = 50 # “展示前 N 名”滑块上限：筛选结果只保留前这么多行，后台预取也按此范围
+
+# 持仓信号编码表：(建议操作, 原因, 底色, 边框色)，下标即 check_sell_signals 中的 signal_code
+SELL_SIGNAL_TYPES = (
+    ("持仓观察", "趋势正常", "#e6f3ff", "#ccc"),
+    ("🛑 止损卖出", "触及-3%止损线", "#ffe6e6", "red"),
+    ("💰 止盈/避险", "", "#fff5e6", "orange"), # 原因按回撤幅度单独填充
+    ("⚠️ 弱势预警", "水下震荡", "#ffffcc", "#cccc00"),
+)
+
 class YangStrategy:
     
     @staticmethod
@@ -120,21 +351,20 @@ class YangStrategy:
         for i in range(max_retries):
             try:
                 df = ak.stock_zh_a_spot_em()
-                df = df.rename(columns={
-                    '代码': 'Symbol', '名称': 'Name', '最新价': 'Price',
-                    '涨跌幅': 'Change_Pct', '换手率': 'Turnover_Rate',
-                    '量比': 'Volume_Ratio', '总市值': 'Market_Cap',
-                    '流通市值': 'Circulating_Cap',
-                    '最高': 'High', '最低': 'Low', '今开': 'Open',
-                    '成交量': 'Volume', '成交额': 'Amount'
-                })
+                df = df.rename(columns=AK_SPOT_RENAME)
                 cols = ['Price', 'Change_Pct', 'Turnover_Rate', 'Volume_Ratio', 'Market_Cap', 'Circulating_Cap', 'High', 'Low', 'Open', 'Volume', 'Amount']
-                for col in cols:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-                df['Symbol'] = df['Symbol'].astype(str)
+                df = df[['Symbol', 'Name'] + cols] # 只保留用到的列，其余几十列直接丢弃
+                # 数值列统一 float32、代码/名称用 category，快照内存约减半，筛选时带宽更省
+                numeric = df[cols].apply(pd.to_numeric, errors='coerce')
+                # 派生列随快照算一次，filter_stocks 只剩纯比较；在转 float32 之前按 float64 算，比值不带存储误差
+                df['Market_Cap_Billions'] = numeric['Market_Cap'] / 100000000
+                df['Circulating_Ratio'] = numeric['Circulating_Cap'] / numeric['Market_Cap'].replace(0, 1) * 100
+                df[cols] = numeric.astype('float32')
+                df['Symbol'] = df['Symbol'].astype(str).astype('category') # 整数编码，持仓 isin 更快
+                df['Name'] = df['Name'].astype('category')
                 return df, None
             except Exception as e:
-                sleep_time = (i + 1) * 3
+                sleep_time = min(8, 1.5 * (2 ** i) + random.random()) # 指数退避 + 抖动，单次上限 8s
                 if i < max_retries - 1:
                     time.sleep(sleep_time)
                     continue
@@ -144,133 +374,147 @@ class YangStrategy:
 
     @staticmethod
     def calculate_battle_plan(df):
-        if df.empty: return df
+        # 全部是整列运算，0 行输入 (无候选) 也照常产出与有候选时相同的列与类型，无需单独维护空表结构
         df['Buy_Price'] = df['Price']
         df['Stop_Loss'] = df['Price'] * 0.97
         df['Target_Price'] = df['Price'] * 1.08
         
-        def analyze_morphology(row):
-            if row['Price'] == 0: return "数据缺失", 0 # 返回元组 (描述, 权重分)
-            
-            avg_price = 0
-            if row['Volume'] > 0:
-                avg_price = row['Amount'] / (row['Volume'] * 100)
-            
-            vwap_status = ""
-            if avg_price > 0:
-                if row['Price'] > avg_price: vwap_status = "🌊水上"
-                else: vwap_status = "🏊水下"
-
-            upper_shadow = 0
-            if row['Price'] > 0:
-                upper_shadow = (row['High'] - row['Price']) / row['Price']
-            
-            pre_close = row['Price'] / (1 + row['Change_Pct'] / 100)
-            max_change_pct = (row['High'] - pre_close) / pre_close * 100 if pre_close > 0 else 0
-
-            # 增加返回一个 morph_score 用于排序
-            if max_change_pct > 9.5 and row['Change_Pct'] < 9.0:
-                return f"💣 炸板 | {vwap_status}", -10
-            
-            if upper_shadow < 0.005 and row['Change_Pct'] > 3.0:
-                return f"🚀 光头强 | {vwap_status}", 10 # 最高优先级
-            
-            if upper_shadow > 0.02:
-                return f"⚡ 长上影 | {vwap_status}", 0
-            
-            return f"✅ 均势 | {vwap_status}", 5
-
-        # 应用函数并拆分结果
-        morph_results = df.apply(analyze_morphology, axis=1)
-        df['Morphology'] = morph_results.apply(lambda x: x[0])
-        df['Morph_Score'] = morph_results.apply(lambda x: x[1]) # 隐藏列，用于排序
-
-        def calculate_win_score(row):
-            score = 60
-            if row['Turnover_Rate'] > 15: score += 15
-            elif row['Turnover_Rate'] > 10: score += 10
-            if row['Volume_Ratio'] > 4.0: score += 10
-            elif row['Volume_Ratio'] > 2.5: score += 8
-            if "水上" in row['Morphology']: score += 10
-            if "光头强" in row['Morphology']: score += 15
-            elif "长上影" in row['Morphology']: score -= 15
-            elif "炸板" in row['Morphology']: score -= 30
-            if row['Circulating_Ratio'] > 80: score += 5
-            if 4.0 <= row['Change_Pct'] <= 8.5: score += 5
-            return min(max(score, 0), 99)
-
-        df['Win_Score'] = df.apply(calculate_win_score, axis=1)
+        # 价格与涨跌幅行情源本身都是两位小数，float32 存储后先还原回两位小数再比较，
+        # 否则 22.00 / 22.11 这类恰好落在 0.5%、2% 影线边界上的行会与 float64 结果不一致
+        price, high, change_pct = (
+            np.round(df[c].to_numpy(dtype=np.float64), 2) for c in ('Price', 'High', 'Change_Pct')
+        )
+        volume, amount = (df[c].to_numpy(dtype=np.float64) for c in ('Volume', 'Amount'))
+
+        # 中间量整列只算一次，形态与胜率分共用，胜率分不再解析形态字符串
+        with np.errstate(divide='ignore', invalid='ignore'):
+            avg_price = np.where(volume > 0, amount / (volume * 100), 0)
+            upper_shadow = np.where(price > 0, (high - price) / price, 0)
+            pre_close = price / (1 + change_pct / 100)
+            max_change_pct = np.where(pre_close > 0, (high - pre_close) / pre_close * 100, 0)
+
+        is_missing = price == 0
+        is_zhaban = (max_change_pct > 9.5) & (change_pct < 9.0)
+        is_guangtou = (upper_shadow < 0.005) & (change_pct > 3.0)  # 光头强：最高优先级
+        is_changshang = upper_shadow > 0.02
+        vwap_code = np.where(avg_price > 0, np.where(price > avg_price, 1, 2), 0)
+
+        # 条件顺序即优先级，编码对应 MORPH_TYPES 下标
+        morph_code = np.select([is_missing, is_zhaban, is_guangtou, is_changshang], [0, 1, 2, 3], default=4)
+        df['Morphology'] = MORPH_LABELS[morph_code * len(VWAP_TYPES) + vwap_code]
+        df['Morph_Code'] = morph_code.astype(np.int8) # 隐藏列，后续按编码判断形态，不再匹配字符串
+        df['Morph_Score'] = MORPH_SCORES[morph_code] # 隐藏列，用于排序
+
+        turnover = df['Turnover_Rate'].to_numpy()
+        vol_ratio = df['Volume_Ratio'].to_numpy()
+        score = np.full(len(df), 60)
+        score += np.select([turnover > 15, turnover > 10], [15, 10], default=0)
+        score += np.select([vol_ratio > 4.0, vol_ratio > 2.5], [10, 8], default=0)
+        score += 10 * (~is_missing & (vwap_code == 1))
+        score += MORPH_WIN_BONUS[morph_code]
+        score += 5 * (df['Circulating_Ratio'].to_numpy() > 80)
+        score += 5 * ((change_pct >= 4.0) & (change_pct <= 8.5))
+        df['Win_Score'] = np.clip(score, 0, 99)
         return df
 
     @staticmethod
     def check_sell_signals(holdings_df):
-        signals = []
         if holdings_df.empty: return pd.DataFrame()
-        for _, row in holdings_df.iterrows():
-            reason = []
-            status = "持仓观察"
-            color = "#e6f3ff"; border_color = "#ccc"
-            if row['Change_Pct'] < -3.0:
-                status = "🛑 止损卖出"; reason.append("触及-3%止损线")
-                color = "#ffe6e6"; border_color = "red"
-            elif row['High'] > 0:
-                drawdown = (row['High'] - row['Price']) / row['High'] * 100
-                if row['Change_Pct'] > 0 and drawdown > 4.0:
-                    status = "💰 止盈/避险"; reason.append(f"回撤{drawdown:.1f}%")
-                    color = "#fff5e6"; border_color = "orange"
-                elif row['Change_Pct'] < 0 and row['Price'] < row['Open']:
-                    status = "⚠️ 弱势预警"; reason.append("水下震荡")
-                    color = "#ffffcc"; border_color = "#cccc00"
-            signals.append({
-                "代码": row['Symbol'], "名称": row['Name'], "现价": row['Price'],
-                "涨跌幅": f"{row['Change_Pct']}%", "建议操作": status,
-                "原因": "; ".join(reason) if reason else "趋势正常",
-                "Color": color, "Border": border_color
-            })
-        return pd.DataFrame(signals)
+        price, high, change_pct = holdings_df['Price'], holdings_df['High'], holdings_df['Change_Pct']
+        drawdown = ((high - price) / high * 100).where(high > 0, 0)
+
+        # 条件顺序即优先级，编码对应 SELL_SIGNAL_TYPES 下标
+        stop = change_pct < -3.0
+        profit = ~stop & (high > 0) & (change_pct > 0) & (drawdown > 4.0)
+        weak = (high > 0) & (change_pct < 0) & (price < holdings_df['Open'])
+        signal_code = np.select([stop, profit, weak], [1, 2, 3], default=0)
+        status, reason, color, border_color = (np.array(col, dtype=object)[signal_code] for col in zip(*SELL_SIGNAL_TYPES))
+        reason[profit.to_numpy()] = drawdown[profit].map("回撤{:.1f}%".format).to_numpy()
+
+        return pd.DataFrame({
+            "代码": holdings_df['Symbol'].to_numpy(), "名称": holdings_df['Name'].to_numpy(), "现价": price.to_numpy(),
+            "涨跌幅": (change_pct.astype(str) + "%").to_numpy(), "建议操作": status,
+            "原因": reason,
+            "Color": color, "Border": border_color
+        })
+
+    @staticmethod
+    def classify_history(prices, ma5, ma10, lowest_20):
+        # 各参数为等长数组，一次判定多只股票的均线趋势与相对 20 日低点的位置
+        above_ma5 = (ma5 > 0) & (prices > ma5)
+        trends = np.select(
+            [above_ma5 & (ma10 > 0) & (ma5 > ma10), above_ma5, (ma5 > 0) & (prices < ma5)],
+            ["📈 多头排列", "📈 短线强势", "📉 破5日线"], default="⚪ 震荡"
+        )
+        positions = np.where(prices / lowest_20 > 1.6, "⚠️ 高位(慎)", "✅ 底部/腰部")
+        return trends, positions
 
     @staticmethod
     def filter_stocks(df, max_cap, min_turnover, min_change, max_change, min_vol_ratio, min_circ_ratio, sort_method):
-        if df.empty: return df
-        
-        df['Market_Cap_Billions'] = df['Market_Cap'] / 100000000
-        df['Market_Cap'] = df['Market_Cap'].replace(0, 1)
-        df['Circulating_Ratio'] = (df['Circulating_Cap'] / df['Market_Cap']) * 100
+        # 在 NumPy 数组上一次性构造布尔掩码，不回写原始行情表
+        market_cap_billions = df['Market_Cap_Billions'].to_numpy()
+        circulating_ratio = df['Circulating_Ratio'].to_numpy()
+        turnover = df['Turnover_Rate'].to_numpy()
+        change_pct = df['Change_Pct'].to_numpy()
+        vol_ratio = df['Volume_Ratio'].to_numpy()
+        # 阈值先转成对应列的精度 (float32)：否则 numexpr 按 float64 比较，恰好等于阈值的行
+        # (如换手率 float32(5.1) >= 5.1) 会被误删，结果还会因是否安装 numexpr 而不同
+        max_cap = market_cap_billions.dtype.type(max_cap)
+        min_circ_ratio = circulating_ratio.dtype.type(min_circ_ratio)
+        min_turnover = turnover.dtype.type(min_turnover)
+        min_change, max_change = change_pct.dtype.type(min_change), change_pct.dtype.type(max_change)
+        min_vol_ratio = vol_ratio.dtype.type(min_vol_ratio)
         
-        filtered = df[
-            (df['Market_Cap_Billions'] <= max_cap) &
-            (df['Turnover_Rate'] >= min_turnover) &
-            (df['Change_Pct'] >= min_change) & 
-            (df['Change_Pct'] <= max_change) &
-            (df['Volume_Ratio'] >= min_vol_ratio) &
-            (df['Circulating_Ratio'] >= min_circ_ratio) 
-        ]
+        if ne is not None:
+            # numexpr 单趟融合六个比较，省去中间布尔数组
+            mask = ne.evaluate(FILTER_EXPR)
+        else:
+            mask = np.logical_and.reduce([
+                market_cap_billions <= max_cap,
+                turnover >= min_turnover,
+                change_pct >= min_change,
+                change_pct <= max_change,
+                vol_ratio >= min_vol_ratio,
+                circulating_ratio >= min_circ_ratio,
+            ])
+        filtered = df[mask]
         
         result = YangStrategy.calculate_battle_plan(filtered)
         
         # --- 核心：后端多维排序 ---
-        if sort_method == "🔥 综合评分 (默认)":
-            return result.sort_values(by=['Win_Score', 'Turnover_Rate'], ascending=[False, False])
-        elif sort_method == "🚀 形态优先 (光头强)":
-            # 先按形态分(Morph_Score)，再按胜率分
-            return result.sort_values(by=['Morph_Score', 'Win_Score'], ascending=[False, False])
-        elif sort_method == "💰 资金优先 (换手)":
-            return result.sort_values(by=['Turnover_Rate', 'Win_Score'], ascending=[False, False])
-        elif sort_method == "🌊 抢筹优先 (量比)":
-            return result.sort_values(by=['Volume_Ratio', 'Win_Score'], ascending=[False, False])
-        else:
-            return result.sort_values(by='Win_Score', ascending=False)
+        # 界面最多展示 TOP_N_LIMIT 行，用部分选择取前 k 名，不必对全部候选整体排序
+        return result.nlargest(TOP_N_LIMIT, SORT_RULES.get(sort_method, ['Win_Score']))
+
+# 以行情内容摘要作为版本号：后台只整体替换行情表，内容不变版本就不变，筛选结果可跨多个刷新周期复用
+# _raw_df 以下划线开头，st.cache_data 不对其做哈希
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def filter_stocks_cached(data_version, _raw_df, max_cap, min_turnover, min_change, max_change, min_vol_ratio, min_circ_ratio, sort_method):
+    return YangStrategy.filter_stocks(_raw_df, max_cap, min_turnover, min_change, max_change, min_vol_ratio, min_circ_ratio, sort_method)
 
 # --- 6. 后台数据引擎 ---
+SNAPSHOT_PATH = os.path.join(".cache", "raw_spot.pkl")
+STALE_AFTER_SECONDS = 360 # 超过两个刷新周期未更新即视为旧快照
+
+# 行情内容摘要，作为数据版本号；盘后/午休行情不动时摘要不变
+def frame_digest(df):
+    return hashlib.md5(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()).hexdigest()
+
+# 侧边栏默认筛选条件；后台按它预取候选股历史，用户打开页面时多数请求直接命中缓存
+DEFAULT_FILTERS = dict(max_cap=200, min_turnover=5.0, min_change=2.0, max_change=8.5, min_vol_ratio=1.5, min_circ_ratio=50)
+
 class BackgroundEngine:
     def __init__(self):
-        self.raw_data = pd.DataFrame()
-        self.last_update_time = None
-        self.last_error = None
+        # (行情表, 数据版本, 更新时间, 错误信息) 打包成一个元组整体发布：只有后台线程写，
+        # 单次属性赋值在 CPython 中是原子的，读者要么看到旧快照要么看到新快照，无需加锁
+        self.snapshot = (pd.DataFrame(), None, None, None)
         self.error_count = 0 
-        self.lock = threading.Lock()
+        self.last_success = time.monotonic()
         self.running = True
         self.bj_tz = timezone(timedelta(hours=8))
+        self._load_snapshot()
+        # 单线程预取：与界面共用 hist_rate_limiter，最多只占 3 个限流名额中的 1 个
+        self.prefetch_pool = ThreadPoolExecutor(max_workers=1)
+        self.prefetch_futures = {} # 代码 -> Future，只由后台线程读写
         self.thread = threading.Thread(target=self._worker_loop, daemon=True)
         self.thread.start()
         
@@ -278,23 +522,64 @@ class BackgroundEngine:
         while self.running:
             try:
                 new_df, error_msg = YangStrategy.get_market_data_silent()
-                with self.lock:
-                    if not new_df.empty:
-                        self.raw_data = new_df
-                        self.last_update_time = datetime.now(self.bj_tz)
-                        self.last_error = None; self.error_count = 0   
-                    elif error_msg:
-                        self.error_count += 1
-                        if self.error_count >= 3: self.last_error = error_msg
+                if not new_df.empty:
+                    raw_data, data_version = self.snapshot[:2]
+                    new_version = frame_digest(new_df)
+                    self.error_count = 0
+                    self.last_success = time.monotonic()
+                    if new_version == data_version:
+                        # 行情未变：沿用原表与版本号，只刷新时间，下游缓存保持有效
+                        self.snapshot = (raw_data, data_version, datetime.now(self.bj_tz), None)
+                    else:
+                        self.snapshot = (new_df, new_version, datetime.now(self.bj_tz), None) # 只做引用替换，旧快照保持不变
+                        self._save_snapshot(new_df)
+                        self._prefetch_history(new_df)
+                elif error_msg:
+                    self._record_error(error_msg)
             except Exception as e:
-                with self.lock:
-                    self.error_count += 1
-                    if self.error_count >= 3: self.last_error = f"Loop Crash: {str(e)}"
-            time.sleep(180) 
+                self._record_error(f"Loop Crash: {str(e)}")
+            # 刚成功时 60s 后刷新，连续失败则逐步放缓，最长 180s
+            time.sleep(min(180, max(60, (time.monotonic() - self.last_success) * 0.5)))
+
+    # 连续失败 3 次才对外暴露错误，沿用当前行情表与更新时间
+    def _record_error(self, error_msg):
+        self.error_count += 1
+        if self.error_count >= 3:
+            raw_data, data_version, last_update_time, _ = self.snapshot
+            self.snapshot = (raw_data, data_version, last_update_time, error_msg)
+
+    # 历史水位与现价无关，提前放进缓存池异步拉取，不阻塞行情刷新
+    # 上一批尚未跑完时整轮跳过，避免任务在线程池队列里越积越多；近期失败（负缓存未过期）的代码不再提交
+    def _prefetch_history(self, df):
+        self.prefetch_futures = {s: f for s, f in self.prefetch_futures.items() if not f.done()}
+        if self.prefetch_futures: return
+        candidates = YangStrategy.filter_stocks(df, sort_method=next(iter(SORT_RULES)), **DEFAULT_FILTERS)
+        for symbol in candidates.loc[candidates['Morph_Code'] == MORPH_GUANGTOU, 'Symbol']:
+            symbol = str(symbol)
+            if symbol in self.prefetch_futures or hist_cache.get(hist_fail_key(symbol)) is not None: continue
+            self.prefetch_futures[symbol] = self.prefetch_pool.submit(fetch_history_levels, symbol)
+
+    # 重启时先用磁盘快照秒开首屏，后台线程随后拉取最新行情覆盖
+    def _load_snapshot(self):
+        try:
+            raw_data = pd.read_pickle(SNAPSHOT_PATH)
+            self.snapshot = (
+                raw_data, frame_digest(raw_data),
+                datetime.fromtimestamp(os.path.getmtime(SNAPSHOT_PATH), self.bj_tz),
+                None
+            )
+        except Exception:
+            pass
+
+    def _save_snapshot(self, df):
+        write_pickle_atomic(df, SNAPSHOT_PATH)
 
     def get_data(self):
-        with self.lock:
-            return self.raw_data.copy(), self.last_update_time, self.last_error
+        # _worker_loop 只整体替换快照、从不原地修改行情表；配合写时复制，调用方拿到引用即可，无需拷贝
+        raw_data, data_version, last_update_time, last_error = self.snapshot
+        stale = last_update_time is not None and \
+            (datetime.now(self.bj_tz) - last_update_time).total_seconds() > STALE_AFTER_SECONDS
+        return raw_data, data_version, last_update_time, last_error, stale
 
 @st.cache_resource
 def get_global_engine():
@@ -307,26 +592,26 @@ st.title("🦅 游资捕手 v6.8：主动排序版")
 
 with st.sidebar:
     st.header("⚙️ 1. 基础筛选")
-    max_cap = st.slider("最大市值 (亿)", 50, 500, 200)
+    max_cap = st.slider("最大市值 (亿)", 50, 500, DEFAULT_FILTERS['max_cap'])
     col1, col2 = st.columns(2)
-    min_change = col1.number_input("涨幅下限", 2.0)
-    max_change = col2.number_input("涨幅上限", 8.5)
+    min_change = col1.number_input("涨幅下限", DEFAULT_FILTERS['min_change'])
+    max_change = col2.number_input("涨幅上限", DEFAULT_FILTERS['max_change'])
     
     st.markdown("---")
     st.header("⚖️ 2. 资金/结构")
-    min_turnover = st.slider("最低换手率 (%)", 1.0, 15.0, 5.0)
-    min_vol_ratio = st.number_input("最低量比 (建议>1.0)", 1.5)
-    min_circ_ratio = st.slider("最低流通盘占比 (%)", 0, 100, 50)
+    min_turnover = st.slider("最低换手率 (%)", 1.0, 15.0, DEFAULT_FILTERS['min_turnover'])
+    min_vol_ratio = st.number_input("最低量比 (建议>1.0)", DEFAULT_FILTERS['min_vol_ratio'])
+    min_circ_ratio = st.slider("最低流通盘占比 (%)", 0, 100, DEFAULT_FILTERS['min_circ_ratio'])
     
     st.markdown("---")
     # --- 新增：排序偏好 ---
     st.header("📊 3. 排序偏好 (解决多选难)")
     sort_method = st.selectbox(
         "选择优先展示逻辑：",
-        ["🔥 综合评分 (默认)", "🚀 形态优先 (光头强)", "💰 资金优先 (换手)", "🌊 抢筹优先 (量比)"],
+        list(SORT_RULES),
         help="直接在后台进行多维度排序，比前端点击表头更稳定。"
     )
-    top_n = st.slider("🎯 展示前 N 名", 5, 50, 10)
+    top_n = st.slider("🎯 展示前 N 名", 5, TOP_N_LIMIT, 10)
     
     st.divider()
     st.header("🛡️ 4. 持仓监控")
@@ -335,17 +620,30 @@ with st.sidebar:
     st.divider()
     if st.button("🚀 刷新", type="primary"): st.rerun()
     if st.checkbox("自动同步 (180s)", value=False):
-        time.sleep(180); st.rerun()
+        st_autorefresh(interval=180_000, key="auto_sync")
 
 # --- 8. 主展示逻辑 ---
+SELL_CARD_HTML = """<div style="background-color:{color}; border:1px solid {border}; padding:15px; border-radius:8px;">
+<b>{name} ({code})</b><br>
+现价: {price:.2f} <span style="color:{change_color}">({change})</span>
+<hr style="margin:5px 0">
+<b>建议: {action}</b><br>
+<small>{reason}</small>
+</div>"""
+SELL_GRID_HTML = '<div style="display:grid; grid-template-columns:repeat(auto-fill, minmax(220px, 1fr)); gap:10px;">{cards}</div>'
+PROGRESS_MIN_INTERVAL = 0.25
+
 status_placeholder = st.empty()
-raw_df, last_time, last_error = data_engine.get_data()
+raw_df, data_version, last_time, last_error, is_stale = data_engine.get_data()
 
 if not raw_df.empty:
     time_str = last_time.strftime('%H:%M:%S')
     
+    # 先用旧快照渲染，后台线程刷新完成后下次重跑即为最新数据
     if last_error:
         status_placeholder.warning(f"⚡ 网络波动 (使用缓存 {time_str})，后台重连中...")
+    elif is_stale:
+        status_placeholder.info(f"⏳ 显示缓存快照 ({last_time.strftime('%m-%d %H:%M:%S')})，后台刷新中...")
     else:
         status_placeholder.success(f"✅ 系统正常 | 更新: {time_str} | 当前排序：{sort_method}")
 
@@ -368,27 +666,46 @@ if not raw_df.empty:
             * **止损红线**：跌破 **[🛑 止损价]** (-3%) 无条件清仓。
             """)
 
-        full_result = YangStrategy.filter_stocks(
-            raw_df, max_cap, min_turnover, min_change, max_change, 
-            min_vol_ratio, min_circ_ratio, sort_method # 传入排序参数
-        )
+        # 同一会话内参数未变（如仅调整 top_n）时直接复用上次结果，连缓存反序列化也省掉
+        filter_params = (data_version, max_cap, min_turnover, min_change, max_change, min_vol_ratio, min_circ_ratio, sort_method)
+        if st.session_state.get("last_filter_params") == filter_params:
+            full_result = st.session_state["last_full_result"]
+        else:
+            full_result = filter_stocks_cached(
+                data_version, raw_df, max_cap, min_turnover, min_change, max_change, 
+                min_vol_ratio, min_circ_ratio, sort_method # 传入排序参数
+            )
+            st.session_state["last_filter_params"] = filter_params
+            st.session_state["last_full_result"] = full_result
         display_result = full_result.head(top_n).copy()
         
         if len(display_result) > 0:
-            trends = []
-            positions = []
-            progress_bar = st.progress(0)
             target_count = len(display_result)
+            trends = np.full(target_count, "⚪ 非重点", dtype=object)
+            positions = np.full(target_count, "⚪ 跳过", dtype=object)
+            hit_mask = display_result['Morph_Code'].to_numpy() == MORPH_GUANGTOU
+            symbols = display_result['Symbol'].to_numpy()
+            prices = display_result['Price'].to_numpy(dtype=np.float64)
+            levels = np.full((target_count, 3), np.nan)
+            analyzed = np.zeros(target_count, dtype=bool)
+            progress_bar = st.progress(0)
+            last_progress = time.monotonic()
             
-            for i, (index, row) in enumerate(display_result.iterrows()):
-                if "光头强" in row['Morphology']:
-                    t_str, p_str = fetch_stock_history_analysis(row['Symbol'], row['Price'])
-                else:
-                    t_str, p_str = "⚪ 非重点", "⚪ 跳过"
-                
-                trends.append(t_str)
-                positions.append(p_str)
-                progress_bar.progress((i + 1) / target_count)
+            # 历史K线请求为纯 I/O，并发执行；结果按原行号回填
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                futures = {executor.submit(fetch_history_levels, symbols[i]): i for i in np.flatnonzero(hit_mask)}
+                for done, future in enumerate(as_completed(futures), 1):
+                    i = futures[future]
+                    hist_levels, error = future.result()
+                    if error: trends[i], positions[i] = error
+                    else: levels[i] = hist_levels; analyzed[i] = True
+                    # 进度条节流：每 250ms 最多推送一次前端增量，缓存全命中时不推送
+                    if time.monotonic() - last_progress >= PROGRESS_MIN_INTERVAL:
+                        progress_bar.progress(done / len(futures))
+                        last_progress = time.monotonic()
+            
+            if analyzed.any():
+                trends[analyzed], positions[analyzed] = YangStrategy.classify_history(prices[analyzed], *levels[analyzed].T)
             
             display_result['Trend_Check'] = trends
             display_result['Pos_Check'] = positions
@@ -435,31 +752,26 @@ if not raw_df.empty:
                     st.divider()
                     st.subheader(f"📈 {sel_name} ({sel_code}) K线与布林带")
                     
-                    chart_df = get_kline_data(sel_code, sel_name)
+                    chart_df = get_kline_data(sel_code, sel_name, hist_time_bucket())
                     
                     if not chart_df.empty:
-                        chart_df['MA5'] = chart_df['Close'].rolling(5).mean()
-                        chart_df['MA10'] = chart_df['Close'].rolling(10).mean()
-                        chart_df['MA20'] = chart_df['Close'].rolling(20).mean() 
-                        chart_df['STD20'] = chart_df['Close'].rolling(20).std()
-                        chart_df['UPPER'] = chart_df['MA20'] + 2 * chart_df['STD20']
-                        chart_df['LOWER'] = chart_df['MA20'] - 2 * chart_df['STD20'] 
-                        
-                        fig = go.Figure()
-                        
-                        fig.add_trace(go.Scatter(x=chart_df['Date'], y=chart_df['UPPER'], mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'))
-                        fig.add_trace(go.Scatter(x=chart_df['Date'], y=chart_df['LOWER'], mode='lines', line=dict(width=0), fill='tonexty', fillcolor='rgba(128, 128, 128, 0.1)', name='BOLL通道'))
-                        
-                        fig.add_trace(go.Scatter(x=chart_df['Date'], y=chart_df['UPPER'], mode='lines', name='上轨', line=dict(color='gray', width=1, dash='dot')))
-                        fig.add_trace(go.Scatter(x=chart_df['Date'], y=chart_df['LOWER'], mode='lines', name='下轨', line=dict(color='gray', width=1, dash='dot')))
-                        fig.add_trace(go.Scatter(x=chart_df['Date'], y=chart_df['MA20'], mode='lines', name='中轨(MA20)', line=dict(color='purple', width=1.5)))
-                        
-                        fig.add_trace(go.Scatter(x=chart_df['Date'], y=chart_df['MA5'], mode='lines', name='MA5', line=dict(color='orange', width=1.5)))
-                        fig.add_trace(go.Scatter(x=chart_df['Date'], y=chart_df['MA10'], mode='lines', name='MA10', line=dict(color='blue', width=1.5)))
-                        
-                        fig.add_trace(go.Candlestick(x=chart_df['Date'], open=chart_df['Open'], high=chart_df['High'], low=chart_df['Low'], close=chart_df['Close'], increasing_line_color='red', decreasing_line_color='green', name="K线"))
-                        
-                        fig.update_layout(xaxis_rangeslider_visible=False, height=500, margin=dict(l=20, r=20, t=30, b=20), legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
+                        dates = chart_df['Date']
+                        traces = [
+                            go.Scatter(x=dates, y=chart_df['UPPER'], mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'),
+                            go.Scatter(x=dates, y=chart_df['LOWER'], mode='lines', line=dict(width=0), fill='tonexty', fillcolor='rgba(128, 128, 128, 0.1)', name='BOLL通道'),
+                            
+                            go.Scatter(x=dates, y=chart_df['UPPER'], mode='lines', name='上轨', line=dict(color='gray', width=1, dash='dot')),
+                            go.Scatter(x=dates, y=chart_df['LOWER'], mode='lines', name='下轨', line=dict(color='gray', width=1, dash='dot')),
+                            go.Scatter(x=dates, y=chart_df['MA20'], mode='lines', name='中轨(MA20)', line=dict(color='purple', width=1.5)),
+                            
+                            go.Scatter(x=dates, y=chart_df['MA5'], mode='lines', name='MA5', line=dict(color='orange', width=1.5)),
+                            go.Scatter(x=dates, y=chart_df['MA10'], mode='lines', name='MA10', line=dict(color='blue', width=1.5)),
+                            
+                            go.Candlestick(x=dates, open=chart_df['Open'], high=chart_df['High'], low=chart_df['Low'], close=chart_df['Close'], increasing_line_color='red', decreasing_line_color='green', name="K线"),
+                        ]
+                        layout = go.Layout(xaxis_rangeslider_visible=False, height=500, margin=dict(l=20, r=20, t=30, b=20), legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
+                        # 一次性构造，避免逐条 add_trace 反复校验、重建 figure
+                        fig = go.Figure(data=traces, layout=layout)
                         st.plotly_chart(fig, use_container_width=True)
                     else:
                         st.warning("⚠️ 暂无法获取该股票 K 线数据")
@@ -470,23 +782,22 @@ if not raw_df.empty:
             st.info("当前无符合标的。")
 
     with tab2:
-        holding_codes = [c.strip() for c in user_holdings.split(',') if c.strip()]
+        holding_codes = parse_holdings(user_holdings)
         if holding_codes:
-            my_stocks = raw_df[raw_df['Symbol'].isin(holding_codes)]
+            my_stocks = raw_df.loc[raw_df['Symbol'].isin(set(holding_codes))]
             if not my_stocks.empty:
                 sell_signals = YangStrategy.check_sell_signals(my_stocks)
-                cols = st.columns(3)
-                for i, row in sell_signals.iterrows():
-                    with cols[i % 3]:
-                        st.markdown(f"""
-                        <div style="background-color:{row['Color']}; border:1px solid {row['Border']}; padding:15px; border-radius:8px; margin-bottom:10px;">
-                            <b>{row['名称']} ({row['代码']})</b><br>
-                            现价: {row['现价']} <span style="color:{'red' if '-' not in row['涨跌幅'] else 'green'}">({row['涨跌幅']})</span>
-                            <hr style="margin:5px 0">
-                            <b>建议: {row['建议操作']}</b><br>
-                            <small>{row['原因']}</small>
-                        </div>
-                        """, unsafe_allow_html=True)
+                cards = [
+                    SELL_CARD_HTML.format(
+                        color=row.Color, border=row.Border, name=row.名称, code=row.代码,
+                        price=row.现价, change=row.涨跌幅,
+                        change_color='red' if '-' not in row.涨跌幅 else 'green',
+                        action=row.建议操作, reason=row.原因
+                    )
+                    for row in sell_signals.itertuples(index=False)
+                ]
+                # 自适应网格整体一次渲染：宽屏多列，窄屏 (手机) 自动折成单列
+                st.markdown(SELL_GRID_HTML.format(cards="".join(cards)), unsafe_allow_html=True)
             else:
                 st.warning("未找到持仓数据。")
         else: